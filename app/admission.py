@@ -0,0 +1,166 @@
+import asyncio
+import time
+from collections import deque
+
+from app.config import ADMISSION_CLASSES, ADMISSION_RETRY_AFTER
+from app.responses import FastJSONResponse
+
+# Path prefix -> priority class (first match wins). Other paths (static files, docs, metrics) are not limited.
+ROUTE_CLASSES = [
+    ("/can_accept_order", "critical"),
+    ("/clustering/", "analytics"),
+    ("/heatmap/", "analytics"),
+    ("/drivers/positions", "analytics"),
+    ("/drivers/", "standard"),
+    ("/zones/", "standard"),
+]
+
+
+class PriorityClass:
+    """Bounded concurrency + bounded FIFO queue with a maximum queue time for one priority class."""
+
+    def __init__(self, name: str, rank: int, concurrency: int, max_queue: int, deadline: float):
+        self.name = name
+        self.rank = rank  # 0 = most important
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.deadline = deadline
+
+        self.in_flight = 0
+        self._waiters = deque()
+
+        # Counters exposed by /admission/metrics
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """Waits for a slot; returns False if the request must be shed (queue full or deadline exceeded)."""
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+            self._admit(0.0)
+            return True
+
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            return False
+
+        # release() hands its slot over directly to the first waiter by resolving its future
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.deadline)
+        except asyncio.TimeoutError:
+            # release() may hand the slot over in the same loop iteration as the deadline fires:
+            # the request then holds a slot and is admitted, otherwise the slot would be lost
+            if not (waiter.done() and not waiter.cancelled()):
+                self.timed_out += 1
+                return False
+        except BaseException:
+            # Client gone while queued: give back the slot if it had already been handed over
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+        self._admit(time.perf_counter() - start)
+        return True
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _admit(self, queue_time: float):
+        self.admitted += 1
+        self.queue_time_total += queue_time
+        self.queue_time_max = max(self.queue_time_max, queue_time)
+
+    def metrics(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "deadline_s": self.deadline,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "avg_queue_ms": round(1000 * self.queue_time_total / self.admitted, 3) if self.admitted else 0.0,
+            "max_queue_ms": round(1000 * self.queue_time_max, 3)
+        }
+
+
+PRIORITY_CLASSES = {
+    name: PriorityClass(name, rank, *limits)
+    for rank, (name, limits) in enumerate(ADMISSION_CLASSES.items())
+}
+
+
+def classify(path: str):
+    """Returns the PriorityClass of a path, or None if it is not admission-controlled."""
+    for prefix, name in ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return PRIORITY_CLASSES[name]
+    return None
+
+
+def admission_metrics() -> dict:
+    return {name: cls.metrics() for name, cls in PRIORITY_CLASSES.items()}
+
+
+class AdmissionMiddleware:
+    """
+    Admission control in front of the DB pool and threadpool: a request waits for a slot of its
+    priority class, and is rejected with 503 + Retry-After when the queue is full or its queue time
+    exceeds the class deadline. Lower classes are shed at once while a more important class is queueing.
+    """
+
+    def __init__(self, app, retry_after: int = ADMISSION_RETRY_AFTER):
+        self.app = app
+        self.retry_after = retry_after
+
+    def _overloaded_above(self, cls: PriorityClass) -> bool:
+        return any(c.queued for c in PRIORITY_CLASSES.values() if c.rank < cls.rank)
+
+    async def _reject(self, cls: PriorityClass, scope, receive, send):
+        response = FastJSONResponse(
+            {"detail": f"Server overloaded, '{cls.name}' request shed. Retry later."},
+            status_code=503,
+            headers={"Retry-After": str(self.retry_after)}
+        )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        cls = classify(scope["path"]) if scope["type"] == "http" else None
+        if cls is None:
+            await self.app(scope, receive, send)
+            return
+
+        if self._overloaded_above(cls):
+            cls.shed += 1
+            await self._reject(cls, scope, receive, send)
+            return
+
+        if not await cls.acquire():
+            await self._reject(cls, scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            cls.release()
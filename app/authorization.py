@@ -0,0 +1,119 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from geoalchemy2.functions import ST_Contains, ST_GeomFromText
+
+from app.config import AUTHORIZATION_MODE
+from app.models import Zone, Driver
+from app.schemas import DriverCheckRequest
+
+AUTHORIZATION_MODES = ("orm", "fused")
+
+# Zone eligibility + driver upsert in a single statement (a NULL current_time / weather does not filter)
+_AUTHORIZE_PARAMS = ("driver_id", "lon", "lat", "current_time", "weather")
+_AUTHORIZE_DRIVER_SQL = """
+    WITH pt AS (
+        SELECT ST_SetSRID(ST_MakePoint(CAST(:lon AS double precision), CAST(:lat AS double precision)), 4326) AS geom
+    ),
+    zone AS (
+        SELECT z.id
+        FROM zones z, pt
+        WHERE ST_Contains(z.geom, pt.geom)
+          AND (CAST(:current_time AS timestamptz) IS NULL
+               OR ((z.valid_from <= CAST(:current_time AS timestamptz) OR z.valid_from IS NULL)
+                   AND (z.valid_to >= CAST(:current_time AS timestamptz) OR z.valid_to IS NULL)))
+          AND (CAST(:weather AS text) IS NULL
+               OR z.weather_condition = CAST(:weather AS text) OR z.weather_condition IS NULL)
+        LIMIT 1
+    ),
+    upsert AS (
+        INSERT INTO drivers (id, last_position)
+        SELECT CAST(:driver_id AS integer), pt.geom FROM pt
+        ON CONFLICT (id) DO UPDATE SET last_position = EXCLUDED.last_position, updated_at = now()
+        RETURNING id
+    )
+    SELECT EXISTS (SELECT 1 FROM zone) AS authorized, (SELECT id FROM upsert) AS driver_id
+"""
+
+# psycopg2 interpolates parameters client-side, so the statement is PREPAREd explicitly on the server ...
+_PREPARE_AUTHORIZE_DRIVER = (
+    "PREPARE authorize_driver (integer, double precision, double precision, timestamptz, text) AS"
+    + _AUTHORIZE_DRIVER_SQL
+)
+for _i, _name in enumerate(_AUTHORIZE_PARAMS, start=1):
+    _PREPARE_AUTHORIZE_DRIVER = _PREPARE_AUTHORIZE_DRIVER.replace(f":{_name}", f"${_i}")
+
+_EXECUTE_AUTHORIZE_DRIVER = text(
+    "EXECUTE authorize_driver(:driver_id, :lon, :lat, :current_time, :weather)"
+)
+
+# ... while psycopg 3 binds server-side and prepares a statement by itself once it is reused (prepare_threshold)
+_AUTHORIZE_DRIVER = text(_AUTHORIZE_DRIVER_SQL)
+
+
+def authorize_orm(db: Session, request: DriverCheckRequest) -> bool:
+    """Zone check, then driver update through the ORM (several round-trips + commit)."""
+    # 1. Create the delivery person's geographic point
+    point_wkt = f"POINT({request.lon} {request.lat})"
+    point = ST_GeomFromText(point_wkt, 4326)
+
+    # 2. Check if the point is within any active zone (considering time and weather conditions)
+    query = db.query(Zone).filter(ST_Contains(Zone.geom, point))
+
+    current_time = getattr(request, 'current_time', None)
+    weather = getattr(request, 'weather', None)
+
+    if current_time:
+        query = query.filter((Zone.valid_from <= current_time) | (Zone.valid_from.is_(None)),
+                             (Zone.valid_to >= current_time) | (Zone.valid_to.is_(None)))
+    if weather:
+        query = query.filter((Zone.weather_condition == weather) | (Zone.weather_condition.is_(None)))
+
+    zone = query.first()
+
+    # 3. Update the driver's last position in the database (or create a new record if it doesn't exist)
+    driver = db.query(Driver).filter(Driver.id == request.driver_id).first()
+    if driver:
+        driver.last_position = point
+    else:
+        new_driver = Driver(id=request.driver_id, last_position=point)
+        db.add(new_driver)
+
+    db.commit()
+    return zone is not None
+
+
+def authorize_fused(db: Session, request: DriverCheckRequest) -> bool:
+    """Zone check and driver upsert in one prepared statement, committed on its own (one round-trip)."""
+    # Autocommit: no BEGIN/COMMIT exchanges around the statement
+    conn = db.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+
+    params = {
+        "driver_id": request.driver_id,
+        "lon": request.lon,
+        "lat": request.lat,
+        # Same semantics as the ORM path: empty values do not filter
+        "current_time": request.current_time or None,
+        "weather": request.weather or None
+    }
+
+    if conn.dialect.driver != "psycopg2":
+        row = conn.execute(_AUTHORIZE_DRIVER, params).one()
+        return bool(row.authorized)
+
+    # The statement is prepared once per pooled connection (conn.info lives as long as the DBAPI connection)
+    if not conn.info.get("authorize_driver_prepared"):
+        conn.exec_driver_sql(_PREPARE_AUTHORIZE_DRIVER)
+        conn.info["authorize_driver_prepared"] = True
+
+    row = conn.execute(_EXECUTE_AUTHORIZE_DRIVER, params).one()
+    return bool(row.authorized)
+
+
+def authorize_driver(db: Session, request: DriverCheckRequest, mode=None) -> bool:
+    """Returns whether the driver's position is in an active zone, and records it as the driver's last position."""
+    mode = mode or AUTHORIZATION_MODE
+    if mode == "fused":
+        return authorize_fused(db, request)
+    if mode == "orm":
+        return authorize_orm(db, request)
+    raise ValueError(f"Unknown authorization mode '{mode}', expected one of {AUTHORIZATION_MODES}")
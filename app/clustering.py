@@ -0,0 +1,151 @@
+import json
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from geoalchemy2 import Geometry
+from geoalchemy2.shape import from_shape
+from shapely.geometry import MultiPoint, mapping
+import numpy as np
+from sklearn.cluster import DBSCAN
+
+from app.config import CLUSTERING_BACKEND
+from app.models import Order
+
+CLUSTERING_BACKENDS = ("python", "postgis")
+
+# One statement: label every order with ST_ClusterDBSCAN (NULL = noise), then build the hull
+# and centroid of each cluster on the server. Only one row per cluster comes back.
+_POSTGIS_CLUSTER_HULLS = text("""
+    WITH labelled AS (
+        SELECT position,
+               ST_ClusterDBSCAN(position, :eps, :min_samples) OVER () AS cluster_id
+        FROM orders
+    ),
+    clusters AS (
+        SELECT cluster_id, COUNT(*) AS order_count, ST_Collect(position) AS points
+        FROM labelled
+        WHERE cluster_id IS NOT NULL
+        GROUP BY cluster_id
+    )
+    SELECT cluster_id,
+           order_count,
+           ST_ConvexHull(points) AS geom,
+           ST_AsGeoJSON(ST_ConvexHull(points)) AS geometry,
+           ST_AsGeoJSON(ST_Centroid(points)) AS center
+    FROM clusters
+    ORDER BY order_count DESC, cluster_id
+    LIMIT :limit
+""").columns(geom=Geometry(srid=4326))
+
+# Same labelling as above, but one row per order for the /clustering/orders endpoint (noise = -1)
+_POSTGIS_ORDER_LABELS = text("""
+    SELECT id AS order_id,
+           ST_X(position) AS lon,
+           ST_Y(position) AS lat,
+           COALESCE(ST_ClusterDBSCAN(position, :eps, :min_samples) OVER (), -1) AS cluster_id
+    FROM orders
+    ORDER BY id
+""")
+
+
+def resolve_backend(backend=None):
+    """Returns the backend to use (the configured one by default)."""
+    backend = backend or CLUSTERING_BACKEND
+    if backend not in CLUSTERING_BACKENDS:
+        raise ValueError(f"Unknown clustering backend '{backend}', expected one of {CLUSTERING_BACKENDS}")
+    return backend
+
+
+def _python_labels(db: Session, eps: float, min_samples: int):
+    # we explicitly ask for the values X and Y from the database
+    orders_data = db.query(
+        Order.id,
+        func.ST_X(Order.position).label("lon"),
+        func.ST_Y(Order.position).label("lat")
+    ).all()
+
+    if not orders_data:
+        return orders_data, np.empty((0, 2)), np.array([], dtype=int)
+
+    # DBSCAN needs a NumPy array of FLOATS, not strings
+    coords = np.array([[float(o.lon), float(o.lat)] for o in orders_data])
+    clustering = DBSCAN(eps=eps, min_samples=min_samples).fit(coords)
+    return orders_data, coords, clustering.labels_
+
+
+def label_orders(db: Session, eps: float, min_samples: int, backend=None):
+    """Returns every order with its DBSCAN cluster id (-1 for noise)."""
+    if resolve_backend(backend) == "postgis":
+        rows = db.execute(_POSTGIS_ORDER_LABELS, {"eps": eps, "min_samples": min_samples}).all()
+        return [
+            {"order_id": r.order_id, "lon": r.lon, "lat": r.lat, "cluster_id": int(r.cluster_id)}
+            for r in rows
+        ]
+
+    orders_data, _, labels = _python_labels(db, eps, min_samples)
+    return [
+        {
+            "order_id": order.id,
+            "lon": order.lon,
+            "lat": order.lat,
+            "cluster_id": int(labels[i])  # Convert numpy int to native int for JSON serialization
+        }
+        for i, order in enumerate(orders_data)
+    ]
+
+
+def cluster_hulls(db: Session, eps: float = 0.002, min_samples: int = 5, limit=None, backend=None):
+    """
+    Returns the clusters of orders, the biggest first. Each cluster is a dict with its
+    `cluster_id`, `order_count`, convex hull (`geom`) and the hull / centroid as GeoJSON text.
+    """
+    if resolve_backend(backend) == "postgis":
+        rows = db.execute(
+            _POSTGIS_CLUSTER_HULLS, {"eps": eps, "min_samples": min_samples, "limit": limit}
+        ).all()
+        return [
+            {
+                "cluster_id": int(r.cluster_id),
+                "order_count": int(r.order_count),
+                "geom": r.geom,
+                "geometry": r.geometry,
+                "center": r.center
+            }
+            for r in rows
+        ]
+
+    _, coords, labels = _python_labels(db, eps, min_samples)
+
+    # Group the coordinates by label in one pass: sort by label, then split at each new label
+    in_cluster = labels >= 0
+    order = np.argsort(labels[in_cluster], kind="stable")
+    sorted_labels = labels[in_cluster][order]
+    unique_labels, starts, counts = np.unique(sorted_labels, return_index=True, return_counts=True)
+    groups = np.split(coords[in_cluster][order], starts[1:])
+
+    # Biggest clusters first (stable sort keeps the lowest label on ties, like np.argmax)
+    ranking = np.argsort(-counts, kind="stable")
+    if limit is not None:
+        ranking = ranking[:limit]
+
+    clusters = []
+    for idx in ranking:
+        # The coordinates are already in memory: hull and centroid are computed locally (no round-trip)
+        points = MultiPoint(groups[idx])
+        hull = points.convex_hull
+
+        clusters.append({
+            "cluster_id": int(unique_labels[idx]),
+            "order_count": int(counts[idx]),
+            "geom": from_shape(hull, srid=4326, extended=True),
+            "geometry": json.dumps(mapping(hull)),
+            "center": json.dumps(mapping(points.centroid))
+        })
+
+    return clusters
+
+
+def top_cluster(db: Session, eps: float = 0.002, min_samples: int = 5, backend=None):
+    """Returns the densest cluster, or None if DBSCAN found no cluster."""
+    clusters = cluster_hulls(db, eps=eps, min_samples=min_samples, limit=1, backend=backend)
+    return clusters[0] if clusters else None
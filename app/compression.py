@@ -0,0 +1,119 @@
+import gzip
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.config import COMPRESSION_MIN_SIZE, COMPRESSION_THREAD_MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY
+
+# brotli is optional: without it only gzip is negotiated
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/geo+json", "text/")
+
+
+def accepted_encodings(accept_encoding: str):
+    """Encodings listed in an Accept-Encoding header with their q-value (1.0 by default)."""
+    encodings = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        if not name.strip():
+            continue
+        q = 1.0
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                pass
+        encodings[name.strip()] = q
+    return encodings
+
+
+def choose_encoding(accept_encoding: str):
+    """Returns the supported encoding ("br" or "gzip") the client prefers (highest q), or None."""
+    encodings = accepted_encodings(accept_encoding)
+    supported = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    best, best_q = None, 0.0
+    for encoding in supported:
+        # "*" covers the encodings not listed explicitly; q=0 means refused
+        q = encodings.get(encoding, encodings.get("*", 0.0))
+        # On equal q, the first supported encoding (brotli) wins
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Compresses JSON / text responses of at least `minimum_size` bytes with the best encoding
+    the client accepts (brotli, then gzip). Streaming responses are sent unchanged.
+    Bodies of at least `thread_min_size` bytes are compressed in a worker thread, so a large
+    payload does not stall the event loop (and the /can_accept_order requests it serves).
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, thread_min_size: int = COMPRESSION_THREAD_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_min_size = thread_min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+
+            if passthrough:
+                await send(message)
+                return
+
+            # The headers are held back until we know the body size
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) >= self.thread_min_size:
+                body = await anyio.to_thread.run_sync(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,69 @@
+import os
+
+# Clustering backend used by the hotspot / surge endpoints:
+# - "python"  : fetch the orders and run sklearn DBSCAN in the API process
+# - "postgis" : run ST_ClusterDBSCAN + hull/centroid aggregation in a single SQL statement
+CLUSTERING_BACKEND = os.getenv("CLUSTERING_BACKEND", "python")
+
+# Surge layer: every DBSCAN cluster becomes a surge zone whose multiplier grows with the
+# ratio between its orders (demand) and the drivers around it (supply)
+SURGE_EPS = float(os.getenv("SURGE_EPS", "0.002"))                          # ~200m
+SURGE_MIN_SAMPLES = int(os.getenv("SURGE_MIN_SAMPLES", "5"))
+SURGE_SUPPLY_RADIUS = float(os.getenv("SURGE_SUPPLY_RADIUS", "0.005"))      # ~500m around the hull
+SURGE_SUPPLY_WINDOW_SECONDS = float(os.getenv("SURGE_SUPPLY_WINDOW_SECONDS", "600"))  # position seen in the last 10 min
+SURGE_RATIO_STEP = float(os.getenv("SURGE_RATIO_STEP", "0.1"))              # +0.1 per extra order per driver
+SURGE_MAX_MULTIPLIER = float(os.getenv("SURGE_MAX_MULTIPLIER", "3.0"))
+SURGE_REFRESH_SECONDS = float(os.getenv("SURGE_REFRESH_SECONDS", "30"))
+
+# /can_accept_order implementation:
+# - "orm"   : zone query, then driver SELECT + UPDATE/INSERT and commit through the ORM
+# - "fused" : zone eligibility + driver upsert in one prepared statement, in autocommit (one round-trip)
+AUTHORIZATION_MODE = os.getenv("AUTHORIZATION_MODE", "orm")
+
+# Response compression: bodies smaller than this are sent as is (gzip, or brotli when installed)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# bodies of at least this size are compressed in a worker thread, not on the event loop
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", "65536"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Request tracing (disabled unless TRACE_FILE is set): sampled requests are appended as JSON lines
+# and can be replayed with scripts/replay_trace.py
+TRACE_FILE = os.getenv("TRACE_FILE")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_PATHS = tuple(p for p in os.getenv(
+    "TRACE_PATHS",
+    "/can_accept_order,/zones/geojson,/drivers/,/clustering/,/heatmap/"
+).split(",") if p)
+
+# Admission control: each endpoint belongs to a priority class with bounded concurrency, a bounded
+# queue and a maximum queue time; beyond that the request is shed with 503 + Retry-After
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "on") != "off"
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))        # seconds
+# priority class -> (max concurrent requests, max queued requests, max queue time in seconds),
+# the most important class first
+ADMISSION_CLASSES = {
+    "critical": (
+        int(os.getenv("ADMISSION_CRITICAL_CONCURRENCY", "32")),
+        int(os.getenv("ADMISSION_CRITICAL_QUEUE", "256")),
+        float(os.getenv("ADMISSION_CRITICAL_DEADLINE", "1.0")),
+    ),
+    "standard": (
+        int(os.getenv("ADMISSION_STANDARD_CONCURRENCY", "4")),
+        int(os.getenv("ADMISSION_STANDARD_QUEUE", "32")),
+        float(os.getenv("ADMISSION_STANDARD_DEADLINE", "2.0")),
+    ),
+    "analytics": (
+        int(os.getenv("ADMISSION_ANALYTICS_CONCURRENCY", "2")),
+        int(os.getenv("ADMISSION_ANALYTICS_QUEUE", "8")),
+        float(os.getenv("ADMISSION_ANALYTICS_DEADLINE", "2.0")),
+    ),
+}
+
+# Database pool: by default one connection per admitted request of every class (+1 for the surge
+# refresher thread), so an admitted request never waits on pool checkout outside admission control
+DB_POOL_SIZE = int(os.getenv(
+    "DB_POOL_SIZE",
+    str(sum(concurrency for concurrency, _, _ in ADMISSION_CLASSES.values()) + 1)
+))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "0"))
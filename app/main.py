@@ -1,10 +1,29 @@
-
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.routes import router as api_router
+from app.responses import FastJSONResponse
+from app.compression import CompressionMiddleware
+from app.tracing import TraceMiddleware, TraceWriter
+from app.admission import AdmissionMiddleware
+from app.config import TRACE_FILE, ADMISSION_CONTROL
+from app.surge import start_surge_refresher, stop_surge_refresher
 from fastapi.staticfiles import StaticFiles
 
-# 1. create the application first
-app = FastAPI(title="Delivery Zone API")
+# (optional) trace file written by a background thread, see step 6
+trace_writer = TraceWriter(TRACE_FILE) if TRACE_FILE else None
+
+# The surge layer is rebuilt in a background thread for the lifetime of the application
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_surge_refresher()
+    yield
+    stop_surge_refresher()
+    # Write the records still queued so the end of the capture window is not lost
+    if trace_writer is not None:
+        trace_writer.close()
+
+# 1. create the application first (responses are serialized with orjson by default)
+app = FastAPI(title="Delivery Zone API", default_response_class=FastJSONResponse, lifespan=lifespan)
 
 # 2. include the API router
 app.include_router(api_router)
@@ -12,6 +31,17 @@ app.include_router(api_router)
 # 3. mount the static files directory
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# 4. compress large JSON responses (brotli / gzip, negotiated with Accept-Encoding)
+app.add_middleware(CompressionMiddleware)
+
+# 5. admission control: bounded concurrency per priority class, 503 + Retry-After under overload
+if ADMISSION_CONTROL:
+    app.add_middleware(AdmissionMiddleware)
+
+# 6. (optional) sample real requests into a trace file for offline replay (see scripts/replay_trace.py)
+if trace_writer is not None:
+    app.add_middleware(TraceMiddleware, writer=trace_writer)
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Delivery Zone Authorization Engine"}
\ No newline at end of file
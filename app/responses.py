@@ -0,0 +1,38 @@
+import json
+
+from fastapi.responses import JSONResponse, Response
+
+# orjson is optional: without it we fall back to the standard library
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content) -> bytes:
+    """Serializes content to JSON bytes (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def raw_json(text: str):
+    """
+    Embeds JSON text produced by the database (e.g. ST_AsGeoJSON) in a response without
+    parsing it: orjson.Fragment is written as is. Older orjson / stdlib: parsed once.
+    """
+    if orjson is not None and hasattr(orjson, "Fragment"):
+        return orjson.Fragment(text)
+    return json.loads(text)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson. Returned directly, it also skips FastAPI's jsonable_encoder."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class RawJSONResponse(Response):
+    """Response whose body is JSON already serialized by PostGIS (json_build_object / json_agg)."""
+    media_type = "application/json"
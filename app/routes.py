@@ -1,264 +1,151 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from geoalchemy2.functions import ST_Contains, ST_GeomFromText
-import numpy as np
-from sklearn.cluster import DBSCAN
-from geoalchemy2.functions import ST_ConvexHull, ST_Collect, ST_Centroid, ST_AsGeoJSON
-import json
+from sqlalchemy import func, text
+from typing import Optional
 from app.models import Hotspot
 from sqlalchemy import not_
-from geoalchemy2.shape import to_shape
-from shapely.geometry import mapping
 
 
 # Internal imports
 from app.database import get_db
 from app.models import Zone, Driver, Order
 from app.schemas import DriverCheckRequest, DriverCheckResponse
+from app.clustering import label_orders, resolve_backend
+from app.surge import SurgeMap, current_surge_map, refresh_surge_map
+from app.authorization import authorize_driver
+from app.responses import FastJSONResponse, RawJSONResponse, raw_json
+from app.admission import admission_metrics
 
 router = APIRouter()
 
-# Helper to calculate the current heat zone
-def get_current_surge_zone(db: Session):
-    """Calcule la zone de chaleur actuelle à partir des commandes."""
-    # we explicitly ask for the values X and Y from the database
-    orders_data = db.query(
-        Order.id,
-        func.ST_X(Order.position).label("lon"),
-        func.ST_Y(Order.position).label("lat")
-    ).all()
-
-    if len(orders_data) < 5:
-        return None
-    
-    # We transform the results into a NumPy array of FLOATS
-    coords = np.array([[float(o.lon), float(o.lat)] for o in orders_data])
-    
-    # Now DBSCAN will work because it receives numbers, not strings
-    clustering = DBSCAN(eps=0.002, min_samples=5).fit(coords)
-    
-    unique_labels, counts = np.unique(clustering.labels_[clustering.labels_ >= 0], return_counts=True)
-    if len(unique_labels) == 0:
-        return None
-        
-    top_cluster_id = unique_labels[np.argmax(counts)]
-    top_order_ids = [orders_data[i].id for i, label in enumerate(clustering.labels_) if label == top_cluster_id]
-    
-    return db.query(func.ST_ConvexHull(func.ST_Collect(Order.position)))\
-             .filter(Order.id.in_(top_order_ids)).scalar()
+# Helper to validate the ?backend= switch of the clustering endpoints
+def check_backend(backend: Optional[str]):
+    try:
+        return resolve_backend(backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # --- Endpoint 1 : Check si le driver peut accepter une commande (V3) ---
 @router.post("/can_accept_order", response_model=DriverCheckResponse)
 def can_accept_order(request: DriverCheckRequest, db: Session = Depends(get_db)):
-    # 1. Create the delivery person's geographic point
-    point_wkt = f"POINT({request.lon} {request.lat})"
-    point = ST_GeomFromText(point_wkt, 4326)
-
-    # 2. Check if the point is within any active zone (considering time and weather conditions)
-    query = db.query(Zone).filter(ST_Contains(Zone.geom, point))
-    
-    current_time = getattr(request, 'current_time', None)
-    weather = getattr(request, 'weather', None)
-
-    if current_time:
-        query = query.filter((Zone.valid_from <= current_time) | (Zone.valid_from.is_(None)),
-                             (Zone.valid_to >= current_time) | (Zone.valid_to.is_(None)))
-    if weather:
-        query = query.filter((Zone.weather_condition == weather) | (Zone.weather_condition.is_(None)))
-
-    zone = query.first()
-    authorized = zone is not None
+    # 1. Zone eligibility + update of the driver's last position
+    # (ORM round-trips or a single fused statement, depending on AUTHORIZATION_MODE, see app/authorization.py)
+    authorized = authorize_driver(db, request)
 
-    # 3. Check if the driver is in a surge zone
-    surge_active = False
-    surge_zone_geom = get_current_surge_zone(db) # Retrieve the geometry of the current heat cluster
-    
-    if surge_zone_geom:
-        # Check if the driver's point is within the surge zone geometry
-        is_in_surge = db.query(func.ST_Contains(surge_zone_geom, point)).scalar()
-        surge_active = bool(is_in_surge)
-
-    # 4. Update the driver's last position in the database (or create a new record if it doesn't exist)
-    driver = db.query(Driver).filter(Driver.id == request.driver_id).first()
-    if driver:
-        driver.last_position = point
-    else:
-        new_driver = Driver(id=request.driver_id, last_position=point)
-        db.add(new_driver)
-    
-    db.commit()
+    # 2. Check if the driver is in a surge zone (local STRtree lookup on the surge layer,
+    # rebuilt by a background thread: nothing is recomputed on this path)
+    multiplier = current_surge_map().multiplier_at(request.lon, request.lat)
+    surge_active = multiplier > 1.0
 
     # A SINGLE RETURN at the end with all the info
     return DriverCheckResponse(
         authorized=authorized,
         surge_active=surge_active,
-        multiplier=1.5 if surge_active else 1.0
+        multiplier=multiplier
     )
 
 # --- Endpoint 2 : Order clustering to identify hot spots (V1) ---
 @router.get("/clustering/orders")
-def cluster_orders(eps: float = 0.001, min_samples: int = 3, db: Session = Depends(get_db)):
-    # 1. Retrieve coordinates via PostGIS (ST_X, ST_Y)
-    orders_query = db.query(
-        Order.id,
-        func.ST_X(Order.position).label("lon"),
-        func.ST_Y(Order.position).label("lat")
-    ).all()
+def cluster_orders(eps: float = 0.001, min_samples: int = 3, backend: Optional[str] = None, db: Session = Depends(get_db)):
+    # DBSCAN labels per order, computed in Python (sklearn) or in PostGIS (ST_ClusterDBSCAN)
+    results = label_orders(db, eps, min_samples, backend=check_backend(backend))
 
-    if not orders_query:
+    if not results:
         return {"total_orders": 0, "clusters": []}
 
-    # 2. Transform the results into a NumPy array of FLOATS (DBSCAN needs numbers, not strings)
-    coords = np.array([[o.lon, o.lat] for o in orders_query])
+    labels = {r["cluster_id"] for r in results}
 
-    # 3. Apply DBSCAN clustering
-    clustering = DBSCAN(eps=eps, min_samples=min_samples).fit(coords)
-    labels = clustering.labels_
-
-    # 4. Prepare the results for JSON response (convert numpy types to native Python types)
-    results = []
-    for i, order in enumerate(orders_query):
-        results.append({
-            "order_id": order.id,
-            "lon": order.lon,
-            "lat": order.lat,
-            "cluster_id": int(labels[i])  # Convert numpy int to native int for JSON serialization
-        })
-
-    return {
+    # Returned as a response directly: serialized by orjson, without FastAPI's jsonable_encoder pass
+    return FastJSONResponse({
         "total_orders": len(results),
-        "clusters_found": len(set(labels)) - (1 if -1 in labels else 0),
+        "clusters_found": len(labels) - (1 if -1 in labels else 0),
         "data": results
-    }
+    })
 
 
 # --- Endpoint 3: Dynamic Bonus Zone (V1) ---
 @router.get("/heatmap/top-cluster")
-def get_dynamic_hotspot(db: Session = Depends(get_db)):
+def get_dynamic_hotspot(backend: Optional[str] = None, db: Session = Depends(get_db)):
     """
     Identifie le cluster le plus dense et génère une zone dynamique (Polygone).
     """
-    # 1. Retrieves the clustering data (we reuse the previous logic)
-    orders_query = db.query(
-        Order.id,
-        Order.position,
-        func.ST_X(Order.position).label("lon"),
-        func.ST_Y(Order.position).label("lat")
-    ).all()
-
-    if not orders_query:
-        return {"message": "Aucune commande disponible"}
-
-    coords = np.array([[o.lon, o.lat] for o in orders_query])
-    # eps=0.002 (env 200m), min_samples=5 To find a real dense area
-    clustering = DBSCAN(eps=0.002, min_samples=5).fit(coords)
-    labels = clustering.labels_
+    # Read-only: the live surge layer (every cluster with its demand/supply multiplier). An explicit
+    # ?backend= builds a layer for this response only, without replacing the one used for authorization
+    if backend is None:
+        surge_map = current_surge_map()
+    else:
+        surge_map = SurgeMap.build(db, backend=check_backend(backend))
 
-    # 2. Identify the most dense cluster (the one with the most points, excluding noise)
-    unique_labels, counts = np.unique(labels[labels >= 0], return_counts=True)
-    if len(unique_labels) == 0:
+    if not surge_map.zones:
         return {"message": "Aucun hotspot détecté pour le moment"}
-    
-    top_cluster_id = unique_labels[np.argmax(counts)]
-
-    # 3. Retrieve the IDs of the orders that belong to the winning cluster
-    top_order_ids = [orders_query[i].id for i, label in enumerate(labels) if label == top_cluster_id]
 
-    # 4. Generate the Polygon with PostGIS
-    # ST_Collect groups the points, ST_ConvexHull creates the envelope, ST_AsGeoJSON converts to GeoJSON format
-    hotspot_geom = db.query(
-        func.ST_AsGeoJSON(
-            func.ST_ConvexHull(
-                func.ST_Collect(Order.position)
-            )
-        ).label("geojson"),
-        func.ST_AsGeoJSON(
-            func.ST_Centroid(
-                func.ST_Collect(Order.position)
-            )
-        ).label("center")
-    ).filter(Order.id.in_(top_order_ids)).first()
+    # The zones are sorted by order count, the first one is the densest cluster
+    top = surge_map.zones[0]
 
-    return {
-        "cluster_id": int(top_cluster_id),
-        "order_count": int(max(counts)),
+    # The GeoJSON text of the hull and centroid is embedded as is (raw_json), not parsed and re-serialized
+    return FastJSONResponse({
+        "cluster_id": top["cluster_id"],
+        "order_count": top["order_count"],
         "type": "DYNAMIC_SURGE_ZONE",
-        "geometry": json.loads(hotspot_geom.geojson),
-        "center": json.loads(hotspot_geom.center),
-        "suggested_multiplier": 1.5  # This can be dynamic based on the order count or other factors in a real implementation
-    }
+        "geometry": raw_json(top["geometry"]),
+        "center": raw_json(top["center"]),
+        "suggested_multiplier": top["multiplier"]
+    })
 
 # --- Endpoint 4: Dynamic Bonus Zone with History (V2) ---
 @router.get("/heatmap/surge-zone")
-def get_surge_zone(db: Session = Depends(get_db)):
+def get_surge_zone(backend: Optional[str] = None, db: Session = Depends(get_db)):
     """
-    Identifie le cluster le plus dense et génère une zone de bonus dynamique.
+    Génère la carte des zones de bonus dynamiques (une par cluster) et l'enregistre dans l'historique.
     """
-  # 1. Retrieves the clustering data (we reuse the previous logic, but we ensure to get the coordinates as floats for DBSCAN)
-    orders_data = db.query(
-        Order.id,
-        func.ST_X(Order.position).label("lon"),
-        func.ST_Y(Order.position).label("lat")
-    ).all()
-
-    if len(orders_data) < 5:
-        return {"active": False, "message": "Pas assez de commandes pour un cluster"}
-
-    # 2. Transform the results into a NumPy array of FLOATS (DBSCAN needs numbers, not strings)
-    # convert to float here to avoid any issues with data types that could cause DBSCAN to fail
-    coords = np.array([[float(o.lon), float(o.lat)] for o in orders_data])
+    # 1. Rebuild the surge layer now (hull, centroid and multiplier of every cluster, see app/surge.py).
+    # Only a layer built with the configured backend is published for authorization.
+    if backend is None:
+        surge_map = refresh_surge_map(db)
+    else:
+        surge_map = SurgeMap.build(db, backend=check_backend(backend))
 
-    
-    clustering = DBSCAN(eps=0.002, min_samples=5).fit(coords)
-    
-    unique_labels, counts = np.unique(clustering.labels_[clustering.labels_ >= 0], return_counts=True)
-    if len(unique_labels) == 0:
+    if not surge_map.zones:
         return {"active": False, "message": "Aucun cluster dense détecté"}
 
-    top_cluster_id = unique_labels[np.argmax(counts)]
-    
-    # 3. Retrieve the IDs of the orders that belong to the winning cluster
-    top_order_ids = [orders_data[i].id for i, label in enumerate(clustering.labels_) if label == top_cluster_id]
-
-    # 4. Generate the Polygon with PostGIS
-    # Retrieves both the convex hull geometry and its GeoJSON representation, as well as the centroid for display purposes
-    result = db.query(
-        func.ST_AsGeoJSON(func.ST_ConvexHull(func.ST_Collect(Order.position))).label("geometry"),
-        func.ST_AsGeoJSON(func.ST_Centroid(func.ST_Collect(Order.position))).label("center")
-    ).filter(Order.id.in_(top_order_ids)).first()
+    # 2. We save the raw geometries (not the GeoJSON) in the history table for future analysis
+    save_hotspots_to_history(db, surge_map.zones)
 
-# 5. If we have a valid geometry, we save it in the history table with the order count for future analysis
-    result = db.query(
-        func.ST_ConvexHull(func.ST_Collect(Order.position)).label("geom_raw"),
-        func.ST_AsGeoJSON(func.ST_ConvexHull(func.ST_Collect(Order.position))).label("geojson"),
-        func.ST_AsGeoJSON(func.ST_Centroid(func.ST_Collect(Order.position))).label("center")
-    ).filter(Order.id.in_(top_order_ids)).first()
-
-    if result and result.geom_raw:
-        # We save the raw geometry (not the GeoJSON) in the history table, along with the order count for this cluster
-        save_hotspot_to_history(db, result.geom_raw, int(max(counts)))
+    zones = [
+        {
+            "cluster_id": z["cluster_id"],
+            "surge_multiplier": z["multiplier"],
+            "order_count": z["order_count"],
+            "driver_count": z["driver_count"],
+            "geometry": raw_json(z["geometry"]),
+            "center": raw_json(z["center"])
+        }
+        for z in surge_map.zones
+    ]
 
-    return {
+    # The top-level fields describe the densest zone, as before the multi-zone layer
+    top = zones[0]
+    return FastJSONResponse({
         "active": True,
-        "surge_multiplier": 1.5,
-        "order_count": int(max(counts)),
-        "geometry": json.loads(result.geojson),
-        "center": json.loads(result.center)
-    }
-
-# Helper function to save the detected hotspot in the history table
-def save_hotspot_to_history(db: Session, geom, count: int):
-    """Enregistre la zone détectée dans l'historique."""
-    if geom is None:
-        return
-    
-    new_hotspot = Hotspot(
-        geom=geom,
-        order_count=count,
-        surge_multiplier=1.5
-    )
-    db.add(new_hotspot)
+        "surge_multiplier": top["surge_multiplier"],
+        "order_count": top["order_count"],
+        "geometry": top["geometry"],
+        "center": top["center"],
+        "zones": zones
+    })
+
+# Helper function to save the detected surge zones in the history table
+def save_hotspots_to_history(db: Session, zones):
+    """Enregistre les zones détectées dans l'historique."""
+    for zone in zones:
+        if zone["geom"] is None:
+            continue
+
+        db.add(Hotspot(
+            geom=zone["geom"],
+            order_count=zone["order_count"],
+            surge_multiplier=zone["multiplier"]
+        ))
     db.commit()
 
 # --- Endpoint 5: Anomaly Detection for Drivers (V1) ---
@@ -288,61 +175,51 @@ def get_anomalies(db: Session = Depends(get_db)):
     ]
 
 # --- Endpoint 6: Retrieve zones in GeoJSON format for the map ---
+# The FeatureCollection is built by PostGIS and sent as is, without going through Python objects
+ZONES_GEOJSON_SQL = text("""
+    SELECT json_build_object(
+        'type', 'FeatureCollection',
+        'features', COALESCE(json_agg(json_build_object(
+            'type', 'Feature',
+            'geometry', ST_AsGeoJSON(geom)::json,
+            'properties', json_build_object(
+                'id', id,
+                'name', name,
+                'category', category,
+                'color', CASE WHEN category = 'delivery' THEN 'green' ELSE 'red' END
+            )
+        ) ORDER BY id), '[]'::json)
+    )::text
+    FROM zones
+""")
+
 @router.get("/zones/geojson")
 def get_zones_geojson(db: Session = Depends(get_db)):
-    zones = db.query(Zone).all()
-    features = []
-    
-    for z in zones:
-        # We convert the geometry from the database to a Shapely geometry, then to GeoJSON format for Leaflet
-        shapely_geom = to_shape(z.geom)
-        
-        features.append({
-            "type": "Feature",
-            "geometry": mapping(shapely_geom),
-            "properties": {
-                "id": z.id,
-                "name": z.name,
-                "category": z.category,  # keep the category for styling purposes on the frontend
-                # A default color is added according to the category
-                "color": "green" if z.category == "delivery" else "red"
-            }
-        })
-        
-    return {
-        "type": "FeatureCollection", 
-        "features": features
-    }
+    # The category is kept for styling purposes on the frontend, with a default color according to the category
+    return RawJSONResponse(db.execute(ZONES_GEOJSON_SQL).scalar())
 
 # --- Endpoint 7: Retrieve the last known positions of drivers with anomaly status ---
+# A driver is an anomaly if its last position is NOT contained in any zone of category 'city_boundary'.
+# Only the most recent 1000 drivers are returned, as a JSON array built by PostGIS.
+DRIVERS_POSITIONS_SQL = text("""
+    SELECT COALESCE(json_agg(json_build_object(
+        'id', d.id,
+        'lat', ST_Y(d.last_position),
+        'lon', ST_X(d.last_position),
+        'is_anomaly', NOT EXISTS (
+            SELECT 1 FROM zones z
+            WHERE z.category = 'city_boundary' AND ST_Contains(z.geom, d.last_position)
+        )
+    ) ORDER BY d.id DESC), '[]'::json)::text
+    FROM (SELECT id, last_position FROM drivers ORDER BY id DESC LIMIT 1000) d
+    WHERE d.last_position IS NOT NULL
+""")
+
 @router.get("/drivers/positions")
 def get_drivers_positions(db: Session = Depends(get_db)):
-    # 1. Retrieve all driver IDs whose last position is NOT contained in any zone of category 'city_boundary'
-    # This query returns a list of driver IDs that are outside the city boundary, which we will use to mark anomalies in the next step
-    drivers_in_city_query = db.query(Driver.id).filter(
-        db.query(Zone).filter(
-            Zone.category == 'city_boundary',
-            func.ST_Contains(Zone.geom, Driver.last_position)
-        ).exists()
-    ).all()
-    
-    # We create a set of "safe" driver IDs that are within the city boundary, which will allow us to easily check if a driver is an anomaly in the next step
-    safe_driver_ids = {d[0] for d in drivers_in_city_query}
+    return RawJSONResponse(db.execute(DRIVERS_POSITIONS_SQL).scalar())
 
-    # 2. Retrieve the last known positions of all drivers (we can limit to the most recent 1000 for performance reasons)
-    drivers = db.query(Driver).order_by(Driver.id.desc()).limit(1000).all()
-    
-    positions = []
-    for d in drivers:
-        if d.last_position is not None:
-            # If the ID is not on our "safe" list, it is an anomaly
-            is_anomaly = d.id not in safe_driver_ids
-            
-            positions.append({
-                "id": d.id,
-                "lat": db.scalar(func.ST_Y(d.last_position)),
-                "lon": db.scalar(func.ST_X(d.last_position)),
-                "is_anomaly": is_anomaly
-            })
-            
-    return positions
\ No newline at end of file
+# --- Endpoint 8: Admission control metrics (queue depth, shed requests per priority class) ---
+@router.get("/admission/metrics")
+def get_admission_metrics():
+    return admission_metrics()
@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from geoalchemy2.shape import to_shape
+from shapely.geometry import Point
+from shapely.strtree import STRtree
+
+from app.clustering import cluster_hulls
+from app.database import SessionLocal
+from app.config import (
+    SURGE_EPS, SURGE_MIN_SAMPLES, SURGE_SUPPLY_RADIUS, SURGE_SUPPLY_WINDOW_SECONDS,
+    SURGE_RATIO_STEP, SURGE_MAX_MULTIPLIER, SURGE_REFRESH_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# Drivers around each hull, for all the clusters in one query (idx is 1-based, in the order of :hulls).
+# Only positions updated within :window seconds count: drivers is a table of last-known positions.
+_SUPPLY_PER_HULL = text("""
+    SELECT h.idx, COUNT(d.id) AS drivers
+    FROM unnest(CAST(:hulls AS geometry[])) WITH ORDINALITY AS h(geom, idx)
+    LEFT JOIN drivers d ON ST_DWithin(d.last_position, h.geom, :radius)
+        AND d.updated_at >= now() - make_interval(secs => :window)
+    GROUP BY h.idx
+""")
+
+
+def surge_multiplier(order_count: int, driver_count: int) -> float:
+    """Multiplier for a zone: 1.0 while there is a driver per order, then +SURGE_RATIO_STEP per extra order per driver."""
+    ratio = order_count / max(driver_count, 1)
+    multiplier = 1.0 + SURGE_RATIO_STEP * (ratio - 1)
+    return round(min(max(multiplier, 1.0), SURGE_MAX_MULTIPLIER), 2)
+
+
+class SurgeMap:
+    """
+    Every active surge zone (one per order cluster) with its multiplier, held in an
+    STRtree so a position can be resolved locally without querying PostGIS.
+    """
+
+    def __init__(self, zones, shapes=None):
+        # zones are sorted by order_count, the biggest first (see cluster_hulls)
+        self.zones = zones
+        self.created_at = time.monotonic()
+        self._shapes = shapes if shapes is not None else [to_shape(z["geom"]) for z in zones]
+        self._tree = STRtree(self._shapes) if self._shapes else None
+
+    @classmethod
+    def build(cls, db: Session, backend=None):
+        """Clusters the orders and computes each zone's multiplier from the nearby driver supply."""
+        clusters = cluster_hulls(db, eps=SURGE_EPS, min_samples=SURGE_MIN_SAMPLES, backend=backend)
+
+        # The hull of identical or collinear orders is a POINT / LINESTRING: it covers no area
+        # and does not fit the POLYGON column of the history table, so it is not a surge zone
+        zones, shapes = [], []
+        for cluster in clusters:
+            shape = to_shape(cluster["geom"])
+            if shape.geom_type == "Polygon":
+                zones.append(cluster)
+                shapes.append(shape)
+
+        if zones:
+            supply = dict(db.execute(_SUPPLY_PER_HULL, {
+                "hulls": [str(z["geom"].desc) for z in zones],
+                "radius": SURGE_SUPPLY_RADIUS,
+                "window": SURGE_SUPPLY_WINDOW_SECONDS
+            }).all())
+
+            for i, zone in enumerate(zones, start=1):
+                zone["driver_count"] = int(supply.get(i, 0))
+                zone["multiplier"] = surge_multiplier(zone["order_count"], zone["driver_count"])
+
+        return cls(zones, shapes)
+
+    def zone_at(self, lon: float, lat: float):
+        """Returns the zone with the highest multiplier containing the point, or None."""
+        if self._tree is None:
+            return None
+
+        # STRtree.query(predicate="within") tests point.within(hull), i.e. ST_Contains(hull, point)
+        matches = self._tree.query(Point(lon, lat), predicate="within")
+        if len(matches) == 0:
+            return None
+        return max((self.zones[i] for i in matches), key=lambda z: z["multiplier"])
+
+    def multiplier_at(self, lon: float, lat: float) -> float:
+        zone = self.zone_at(lon, lat)
+        return zone["multiplier"] if zone else 1.0
+
+
+# The shared surge layer, rebuilt every SURGE_REFRESH_SECONDS by a background thread
+_surge_map = SurgeMap([])
+_refresher = None
+_stop_refresher = threading.Event()
+
+
+def current_surge_map() -> SurgeMap:
+    """Returns the published surge layer (empty, i.e. multiplier 1.0 everywhere, until the first build)."""
+    return _surge_map
+
+
+def refresh_surge_map(db: Session, backend=None) -> SurgeMap:
+    """Rebuilds the surge layer now and publishes it for the following requests."""
+    global _surge_map
+    surge_map = SurgeMap.build(db, backend=backend)
+    _surge_map = surge_map
+    return surge_map
+
+
+def _refresh_loop():
+    while not _stop_refresher.is_set():
+        db = SessionLocal()
+        try:
+            refresh_surge_map(db)
+        except Exception:
+            # Keep serving the previous layer, retry at the next interval
+            logger.exception("Surge layer refresh failed")
+        finally:
+            db.close()
+        _stop_refresher.wait(SURGE_REFRESH_SECONDS)
+
+
+def start_surge_refresher():
+    """Starts the background thread that rebuilds the surge layer, off the request path."""
+    global _refresher
+    if _refresher is not None and _refresher.is_alive():
+        return
+    _stop_refresher.clear()
+    _refresher = threading.Thread(target=_refresh_loop, name="surge-refresher", daemon=True)
+    _refresher.start()
+
+
+def stop_surge_refresher():
+    _stop_refresher.set()
+    if _refresher is not None:
+        _refresher.join(timeout=5)
@@ -0,0 +1,112 @@
+import json
+import queue
+import random
+import threading
+import time
+
+from app.config import TRACE_FILE, TRACE_SAMPLE_RATE, TRACE_PATHS
+from app.responses import dumps
+
+# Queued by TraceWriter.close() after the last record
+_STOP = object()
+
+
+class TraceWriter:
+    """
+    Appends trace records to a JSONL file from a background thread: the event loop only enqueues
+    records, decoding, serialization and file I/O happen in the writer thread.
+    """
+
+    def __init__(self, path: str = TRACE_FILE):
+        self._file = open(path, "ab")
+        self._records = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+        self._writer.start()
+
+    def put(self, record):
+        self._records.put(record)
+
+    def close(self):
+        """Writes the records still queued, then stops the writer thread and closes the file."""
+        self._records.put(_STOP)
+        self._writer.join()
+        self._file.close()
+
+    def _write_loop(self):
+        stopping = False
+        while not stopping:
+            batch = [self._records.get()]
+            # Drain what is already queued so that one flush covers the whole batch
+            while True:
+                try:
+                    batch.append(self._records.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [record for record in batch if record is not _STOP]
+            self._file.write(b"".join(self._encode(record) for record in batch))
+            self._file.flush()
+
+    @staticmethod
+    def _encode(record) -> bytes:
+        # The body is kept as JSON when it parses, as text otherwise
+        raw_body = record["body"]
+        try:
+            record["body"] = json.loads(raw_body) if raw_body else None
+        except ValueError:
+            record["body"] = raw_body.decode("utf-8", errors="replace")
+        return dumps(record) + b"\n"
+
+
+class TraceMiddleware:
+    """
+    Samples the requests whose path starts with one of `paths` and hands them to a TraceWriter:
+    one line per request with its start timestamp, method, path, query string, JSON body,
+    response status and server-side duration. scripts/replay_trace.py re-issues such a trace.
+    """
+
+    def __init__(self, app, writer: TraceWriter, sample_rate: float = TRACE_SAMPLE_RATE, paths=TRACE_PATHS):
+        self.app = app
+        self.writer = writer
+        self.sample_rate = sample_rate
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not scope["path"].startswith(self.paths)
+            or random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        ts = time.time()
+        start = time.perf_counter()
+        body = []
+        status = None
+
+        async def receive_traced():
+            message = await receive()
+            if message["type"] == "http.request":
+                body.append(message.get("body", b""))
+            return message
+
+        async def send_traced(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_traced, send_traced)
+        finally:
+            self.writer.put({
+                "ts": round(ts, 6),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope["query_string"].decode("latin-1"),
+                "body": b"".join(body),
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3)
+            })
@@ -0,0 +1,149 @@
+import sys
+import os
+import json
+import time
+import argparse
+
+# Ajout du chemin racine pour que Python trouve le module 'app'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import func
+from geoalchemy2.shape import to_shape
+from shapely.geometry import mapping
+
+from app.database import SessionLocal
+from app.models import Zone, Driver
+from app.routes import get_zones_geojson, get_drivers_positions
+from app.clustering import label_orders
+from app.surge import SurgeMap
+from app.responses import FastJSONResponse, raw_json
+from app.compression import compress, brotli
+
+# Compares, in-process and for each read-only geo endpoint, the previous response path
+# (ORM rows / parsed GeoJSON -> jsonable_encoder -> stdlib json) with the current one
+# (orjson, GeoJSON passed through as text), on the same data:
+# CPU time (process_time, so waiting on PostGIS is not counted), wall time and bytes per encoding.
+# /heatmap/surge-zone is not benchmarked: each call writes to the hotspots history table.
+
+
+def old_response(payload):
+    """FastAPI's default path for a returned dict: jsonable_encoder then stdlib json rendering."""
+    return JSONResponse(jsonable_encoder(payload))
+
+
+# --- Previous handlers, as they were before the response layer ---
+
+def old_zones_geojson(db):
+    features = []
+    for z in db.query(Zone).all():
+        features.append({
+            "type": "Feature",
+            "geometry": mapping(to_shape(z.geom)),
+            "properties": {
+                "id": z.id,
+                "name": z.name,
+                "category": z.category,
+                "color": "green" if z.category == "delivery" else "red"
+            }
+        })
+    return old_response({"type": "FeatureCollection", "features": features})
+
+
+def old_drivers_positions(db):
+    safe_driver_ids = {d[0] for d in db.query(Driver.id).filter(
+        db.query(Zone).filter(
+            Zone.category == 'city_boundary',
+            func.ST_Contains(Zone.geom, Driver.last_position)
+        ).exists()
+    ).all()}
+
+    positions = []
+    for d in db.query(Driver).order_by(Driver.id.desc()).limit(1000).all():
+        if d.last_position is not None:
+            positions.append({
+                "id": d.id,
+                "lat": db.scalar(func.ST_Y(d.last_position)),
+                "lon": db.scalar(func.ST_X(d.last_position)),
+                "is_anomaly": d.id not in safe_driver_ids
+            })
+    return old_response(positions)
+
+
+def top_cluster_payload(top, geojson):
+    return {
+        "cluster_id": top["cluster_id"],
+        "order_count": top["order_count"],
+        "type": "DYNAMIC_SURGE_ZONE",
+        "geometry": geojson(top["geometry"]),
+        "center": geojson(top["center"]),
+        "suggested_multiplier": top["multiplier"]
+    }
+
+
+def build_cases(db):
+    """Endpoint -> (old response path, new response path)."""
+    cases = {
+        "/zones/geojson": (lambda: old_zones_geojson(db), lambda: get_zones_geojson(db)),
+        "/drivers/positions": (lambda: old_drivers_positions(db), lambda: get_drivers_positions(db)),
+    }
+
+    # Clustering and surge layer are computed once: only the response path is compared
+    results = label_orders(db, 0.001, 3)
+    labels = {r["cluster_id"] for r in results}
+    clustering = {
+        "total_orders": len(results),
+        "clusters_found": len(labels) - (1 if -1 in labels else 0),
+        "data": results
+    }
+    cases["/clustering/orders"] = (lambda: old_response(clustering), lambda: FastJSONResponse(clustering))
+
+    zones = SurgeMap.build(db).zones
+    if zones:
+        top = zones[0]
+        cases["/heatmap/top-cluster"] = (
+            lambda: old_response(top_cluster_payload(top, json.loads)),
+            lambda: FastJSONResponse(top_cluster_payload(top, raw_json))
+        )
+    return cases
+
+
+def measure(fn, repeat):
+    """Returns (response body, CPU ms per call, wall ms per call)."""
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(repeat):
+        response = fn()
+    cpu = (time.process_time() - cpu_start) * 1000 / repeat
+    wall = (time.perf_counter() - wall_start) * 1000 / repeat
+    return response.body, cpu, wall
+
+
+def run_benchmark(repeat):
+    encodings = ["gzip", "br"] if brotli is not None else ["gzip"]
+    db = SessionLocal()
+    try:
+        print(f"Response path benchmark ({repeat} calls per endpoint and path)")
+        for path, (old, new) in build_cases(db).items():
+            old_body, old_cpu, old_wall = measure(old, repeat)
+            new_body, new_cpu, new_wall = measure(new, repeat)
+
+            print("-" * 30)
+            print(path)
+            print(f"  old: cpu {old_cpu:.3f} ms, wall {old_wall:.3f} ms, {len(old_body)} bytes")
+            print(f"  new: cpu {new_cpu:.3f} ms, wall {new_wall:.3f} ms, {len(new_body)} bytes "
+                  f"(cpu saved: {old_cpu - new_cpu:.3f} ms/request)")
+            for encoding in encodings:
+                size = len(compress(new_body, encoding))
+                print(f"  new + {encoding:<4}: {size} bytes ({100 * (1 - size / max(len(old_body), 1)):.1f}% saved vs old)")
+        print("-" * 30)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU and bytes saved per geo endpoint by the response layer")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    run_benchmark(args.repeat)
@@ -0,0 +1,71 @@
+import sys
+import os
+import time
+import argparse
+
+# Ajout du chemin racine pour que Python trouve le module 'app'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.clustering import CLUSTERING_BACKENDS, cluster_hulls, label_orders
+
+# Compares the in-Python (sklearn DBSCAN) and PostGIS (ST_ClusterDBSCAN) clustering backends:
+# same inputs, timing of each backend, and the cluster sizes they find.
+
+
+def timed(fn, repeat):
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - start)
+    return result, min(durations), sum(durations) / len(durations)
+
+
+def compare(eps, min_samples, repeat):
+    db = SessionLocal()
+    try:
+        results = {}
+        print(f"Comparing clustering backends (eps={eps}, min_samples={min_samples}, {repeat} runs each)")
+        print("-" * 30)
+
+        for backend in CLUSTERING_BACKENDS:
+            clusters, best, mean = timed(
+                lambda: cluster_hulls(db, eps=eps, min_samples=min_samples, backend=backend), repeat
+            )
+            labels, labels_best, _ = timed(
+                lambda: label_orders(db, eps, min_samples, backend=backend), repeat
+            )
+            results[backend] = (clusters, labels)
+
+            print(f"[{backend}] hulls : best {best * 1000:.2f} ms, mean {mean * 1000:.2f} ms")
+            print(f"[{backend}] labels: best {labels_best * 1000:.2f} ms")
+            print(f"[{backend}] clusters found: {len(clusters)}, sizes: {[c['order_count'] for c in clusters]}")
+
+        print("-" * 30)
+        python_clusters, python_labels = results["python"]
+        postgis_clusters, postgis_labels = results["postgis"]
+
+        # Cluster ids are numbered differently by each backend, so we compare the sizes and the noise
+        same_sizes = sorted(c["order_count"] for c in python_clusters) == sorted(c["order_count"] for c in postgis_clusters)
+        python_noise = {r["order_id"] for r in python_labels if r["cluster_id"] == -1}
+        postgis_noise = {r["order_id"] for r in postgis_labels if r["cluster_id"] == -1}
+
+        print(f"Same cluster sizes: {same_sizes}")
+        print(f"Noise points: python={len(python_noise)}, postgis={len(postgis_noise)}, "
+              f"differing={len(python_noise ^ postgis_noise)}")
+        # DBSCAN border points reachable from two clusters may be assigned differently by each implementation
+        print("-" * 30)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the python and postgis clustering backends")
+    parser.add_argument("--eps", type=float, default=0.002)
+    parser.add_argument("--min-samples", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    compare(args.eps, args.min_samples, args.repeat)
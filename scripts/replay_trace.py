@@ -0,0 +1,136 @@
+import json
+import math
+import time
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# Re-issues a trace recorded by the TraceMiddleware (TRACE_FILE=...) against a local instance,
+# keeping the original order and spacing of the requests (1x), N times faster, or as fast as possible,
+# then reports the latency per endpoint. Use --save to keep the report for before/after comparisons.
+
+API_URL = "http://127.0.0.1:8000"
+
+_local = threading.local()
+
+
+def load_trace(path, limit=None):
+    records = []
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    # The file is written in completion order: replay in arrival order
+    records.sort(key=lambda r: r["ts"])
+    return records[:limit] if limit else records
+
+
+def send(record, url, scheduled=None):
+    """
+    Re-issues one traced request; returns (endpoint, status or None, latency in ms).
+    Open-loop replay (--speed) passes the scheduled send time: the latency is measured from it, so the
+    time spent waiting for a free worker is counted (no coordinated omission). Without a schedule
+    (--max-speed, closed loop) it is measured from when the worker starts the request.
+    """
+    start = scheduled if scheduled is not None else time.perf_counter()
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+
+    target = url + record["path"] + ("?" + record["query"] if record["query"] else "")
+    endpoint = f"{record['method']} {record['path']}"
+
+    try:
+        response = _local.session.request(record["method"], target, json=record["body"])
+        status = response.status_code
+    except requests.RequestException:
+        status = None
+    return endpoint, status, (time.perf_counter() - start) * 1000
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+def replay(records, url, speed, workers):
+    """Replays the records, speed=None meaning as fast as possible. Returns the results and the wall time."""
+    t0 = records[0]["ts"]
+    start = time.perf_counter()
+    futures = []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for record in records:
+            if speed is None:
+                # As fast as possible: the workers pull the requests one after the other, and the
+                # time a request waits behind the ones submitted before it is not server latency
+                scheduled = None
+            else:
+                scheduled = start + (record["ts"] - t0) / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(pool.submit(send, record, url, scheduled))
+
+        results = [f.result() for f in futures]
+
+    return results, time.perf_counter() - start
+
+
+def report(results, wall_time):
+    by_endpoint = defaultdict(list)
+    errors = defaultdict(int)
+    for endpoint, status, latency in results:
+        by_endpoint[endpoint].append(latency)
+        if status is None or status >= 400:
+            errors[endpoint] += 1
+
+    summary = {}
+    print("-" * 30)
+    print(f"{len(results)} requests in {wall_time:.2f} s ({len(results) / max(wall_time, 1e-9):.1f} req/s)")
+    for endpoint in sorted(by_endpoint):
+        latencies = sorted(by_endpoint[endpoint])
+        summary[endpoint] = {
+            "count": len(latencies),
+            "errors": errors[endpoint],
+            "mean_ms": round(sum(latencies) / len(latencies), 3),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "max_ms": round(latencies[-1], 3)
+        }
+        s = summary[endpoint]
+        print(f"{endpoint}: n={s['count']} errors={s['errors']} mean={s['mean_ms']:.2f} ms "
+              f"p50={s['p50_ms']:.2f} p95={s['p95_ms']:.2f} p99={s['p99_ms']:.2f} max={s['max_ms']:.2f}")
+    print("-" * 30)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a request trace and report latency per endpoint")
+    parser.add_argument("trace", help="JSONL trace written by the TraceMiddleware")
+    parser.add_argument("--url", default=API_URL)
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor (2 = twice as fast)")
+    parser.add_argument("--max-speed", action="store_true", help="ignore the timestamps, send as fast as possible")
+    parser.add_argument("--workers", type=int, default=32, help="maximum concurrent requests")
+    parser.add_argument("--limit", type=int, default=None, help="only replay the first N requests")
+    parser.add_argument("--save", default=None, help="write the per-endpoint report to this JSON file")
+    args = parser.parse_args()
+
+    records = load_trace(args.trace, args.limit)
+    if not records:
+        print("Empty trace, nothing to replay.")
+        raise SystemExit(0)
+
+    mode = "as fast as possible" if args.max_speed else f"at {args.speed}x"
+    print(f"Replaying {len(records)} requests against {args.url} {mode}...")
+
+    results, wall_time = replay(records, args.url, None if args.max_speed else args.speed, args.workers)
+    summary = report(results, wall_time)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"requests": len(results), "wall_time_s": round(wall_time, 3), "endpoints": summary}, f, indent=2)
+        print(f"Report saved to {args.save}")